@@ -0,0 +1,158 @@
+# Eğitim için en hızlı `--batch-size` ve `--seq-length` ikilisini, bir bellek
+# bütçesi dahilinde, birkaç eğitim adımını ölçerek seçen fonksiyonların olduğu
+# yer. `python train.py username --autotune` ile kullanılır.
+
+import logging
+import time
+
+import tensorflow as tf
+
+from data_loader import _vocab_kwargs, make_dataset
+from network import YazbelNet
+
+logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
+
+
+def _estimate_memory_mb(batch_size, seq_length, vocab_size, embedding_dim,
+                        rnn_hidden_units):
+    """
+    Rough estimate of the memory a train step of YazbelNet needs, for when the
+    device can't tell its peak memory usage (CPUs can't, nor can GPUs before
+    TF 2.6).
+
+    Weights, their gradients and the two moment estimates of Adam make 4
+    copies of the parameters; per character, the activations kept for the
+    backward pass are the embedding, the 3 gates and the output of the GRU
+    and the logits together with their softmax.
+
+    Returns
+    --------
+        estimated memory in megabytes
+    """
+    num_params = (vocab_size * embedding_dim
+                  + 3 * rnn_hidden_units * (embedding_dim + rnn_hidden_units
+                                            + 2)
+                  + (rnn_hidden_units + 1) * vocab_size)
+    num_activations = batch_size * seq_length * (embedding_dim
+                                                 + 4 * rnn_hidden_units
+                                                 + 2 * vocab_size)
+    return 4 * (4 * num_params + num_activations) / 2**20
+
+
+def _benchmark(username, args, batch_size, seq_length, steps):
+    """
+    Times `steps` train steps of a fresh YazbelNet on the `make_dataset`
+    pipeline with the given batch size and sequence length.
+
+    Returns
+    --------
+        2-tuple of (characters per second, memory in megabytes), or None if
+        the training split has fewer than `steps` + 1 batches of this size
+        (the extra one is for the warm-up step)
+    """
+    # same split as the real training, so that the batches counted below are
+    # the ones `YazbelNet.train` would get
+    train_ds, _, (char2num, _) = make_dataset(username,
+                                              val_frac=args.val_frac,
+                                              seq_length=seq_length,
+                                              batch_size=batch_size,
+                                              **_vocab_kwargs(args))
+    num_batches = int(train_ds.reduce(0, lambda count, _: count + 1))
+    if num_batches < steps + 1:
+        return None
+
+    model = YazbelNet(vocab_size=len(char2num),
+                      embedding_dim=args.embedding_dim,
+                      rnn_hidden_units=args.rnn_hidden_units)
+    loss = args.loss
+    if loss == "sparse_categorical_crossentropy":
+        loss = tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True)
+    model.compile(optimizer=args.optimizer, loss=loss)
+
+    batches = iter(train_ds)
+    # the first step builds the model and traces the train function
+    model.train_on_batch(*next(batches))
+
+    # peak memory stats need TF >= 2.6; otherwise (and on CPU) estimate
+    gpus = tf.config.list_logical_devices("GPU")
+    measure_memory = (gpus
+                      and hasattr(tf.config.experimental,
+                                  "reset_memory_stats")
+                      and hasattr(tf.config.experimental, "get_memory_info"))
+    if measure_memory:
+        tf.config.experimental.reset_memory_stats(gpus[0].name)
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        model.train_on_batch(*next(batches))
+    chars_per_sec = batch_size * seq_length * steps / (
+                                            time.perf_counter() - start)
+
+    if measure_memory:
+        memory_mb = tf.config.experimental.get_memory_info(
+                                                gpus[0].name)["peak"] / 2**20
+    else:
+        memory_mb = _estimate_memory_mb(batch_size, seq_length,
+                                        len(char2num), args.embedding_dim,
+                                        args.rnn_hidden_units)
+    return chars_per_sec, memory_mb
+
+
+def autotune(username, args, batch_sizes=(4, 16, 64, 256),
+             seq_lengths=(50, 100, 200), memory_budget_mb=1024, steps=10):
+    """
+    Benchmarks a few train steps for each (batch size, sequence length) pair
+    in the grid and picks the one that processes the most characters per
+    second whilst staying within the memory budget.
+
+    Parameters
+    -----------
+    username: str
+        should be such that "./replies/{username}.txt" exists
+
+    args: argparse.Namespace
+        the training arguments of `train.py`; model size, loss and optimizer
+        are taken from here
+
+    batch_sizes: iterable of int, optional, default=(4, 16, 64, 256)
+        batch sizes to try
+
+    seq_lengths: iterable of int, optional, default=(50, 100, 200)
+        sequence lengths to try
+
+    memory_budget_mb: float, optional, default=1024
+        configurations needing more memory than this (in MB) are not chosen
+
+    steps: int, optional, default=10
+        number of timed train steps per configuration
+
+    Returns
+    --------
+        2-tuple of (the chosen (batch size, sequence length) or None if none
+        fits, list of dicts of the benchmark results)
+    """
+    results = []
+    for seq_length in seq_lengths:
+        for batch_size in batch_sizes:
+            measured = _benchmark(username, args, batch_size, seq_length,
+                                  steps)
+            if measured is None:
+                logging.info(f"batch_size={batch_size},"
+                             f" seq_length={seq_length}: fewer than"
+                             f" {steps + 1} training batches, skipped")
+                continue
+            chars_per_sec, memory_mb = measured
+            logging.info(f"batch_size={batch_size}, seq_length={seq_length}:"
+                         f" {chars_per_sec:.0f} chars/sec,"
+                         f" {memory_mb:.0f} MB")
+            results.append({"batch_size": batch_size,
+                            "seq_length": seq_length,
+                            "chars_per_sec": chars_per_sec,
+                            "memory_mb": memory_mb})
+
+    fitting = [result for result in results
+               if result["memory_mb"] <= memory_budget_mb]
+    if not fitting:
+        return None, results
+    best = max(fitting, key=lambda result: result["chars_per_sec"])
+    return (best["batch_size"], best["seq_length"]), results
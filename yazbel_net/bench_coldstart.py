@@ -0,0 +1,62 @@
+# Yeni açılan bir `sample.py` sürecinin ilk karakteri üretmesinin ne kadar
+# sürdüğünü (soğuk başlangıç) modeli ağırlıklardan inşa ederek ve dışa
+# aktarılmış SavedModel'i yükleyerek ayrı ayrı ölçen betik.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Command line parser
+parser = argparse.ArgumentParser(
+                # let's show the defaults in --help too
+                formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+parser.add_argument("username",
+                    help="yazbel kullanıcı adı; modeli eğitilmiş olmalı")
+
+parser.add_argument("--runs",
+                    help="her bir yol için kaç süreç başlatılsın?",
+                    type=int,
+                    default=5)
+
+parser.add_argument("--student",
+                    help="damıtılmış küçük model kullanılsın",
+                    action="store_true")
+
+
+def cold_start_seconds(sample_args):
+    """
+    Wall time of a fresh `sample.py` process that generates one character.
+
+    Parameters
+    -----------
+    sample_args: list of str
+        command line arguments of `sample.py`
+
+    Returns
+    --------
+        seconds elapsed
+    """
+    sample_py = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "sample.py")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, sample_py, *sample_args, "--length", "1"],
+                   check=True, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    sample_args = [args.username] + (["--student"] if args.student else [])
+    print(f"{'loader':>12} {'mean (s)':>10} {'min (s)':>10}")
+    for name, extra_args in (("weights", []),
+                             ("savedmodel", ["--savedmodel"])):
+        seconds = [cold_start_seconds(sample_args + extra_args)
+                   for _ in range(args.runs)]
+        print(f"{name:>12} {statistics.mean(seconds):>10.2f}"
+              f" {min(seconds):>10.2f}")
@@ -0,0 +1,151 @@
+# Çok-worker'lı (multi worker) eğitimin ölçeklenmesini yerel makinede ölçen
+# betik: localhost'ta birkaç CPU worker süreci başlatıp (TF_CONFIG'i kendimiz
+# üretiyoruz) worker sayısına karşılık eğitim hızını raporlar.
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+
+from dedup import _deduped_path
+
+logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
+
+# Command line parser
+parser = argparse.ArgumentParser(
+                # let's show the defaults in --help too
+                formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+parser.add_argument("username",
+                    help="yazbel kullanıcı adı; replies/{username}.txt olmalı")
+
+parser.add_argument("--workers",
+                    help="denenecek worker sayıları, virgülle ayrılmış",
+                    default="1,2,4")
+
+parser.add_argument("--epochs",
+                    help="her denemede kaç tam tur dönülsün? ilki (kurulum,"
+                         " izleme) ölçülmez, en az 2 olmalı",
+                    type=int,
+                    default=2)
+
+parser.add_argument("--seq-length",
+                    help="model kaç karakter geriye baksın?",
+                    type=int,
+                    default=100)
+
+parser.add_argument("--batch-size",
+                    help="worker başına bir alt dönüşte kaç numune işlensin?",
+                    type=int,
+                    default=64)
+
+parser.add_argument("--val-frac",
+                    help="verinin ne kadarlık fraksiyonu validasyona gitsin?",
+                    type=float,
+                    default=0.1)
+
+
+def _free_port():
+    """
+    Returns a port number on localhost that is free (at the moment).
+    """
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def run_cluster(num_workers, username, train_args):
+    """
+    Launches `num_workers` `train.py --distribute multi_worker` processes on
+    localhost, each with its own TF_CONFIG, in a scratch directory so that the
+    user's saved models are not touched.
+
+    Parameters
+    -----------
+    num_workers: int
+        how many worker processes to launch
+
+    username: str
+        should be such that "./replies/{username}.txt" exists
+
+    train_args: list of str
+        extra command line arguments passed to each `train.py`
+
+    Returns
+    --------
+        the chief's metrics from the manifest of the trained model
+    """
+    work_dir = tempfile.mkdtemp()
+    try:
+        # the raw replies and, if any, the deduplicated ones that the
+        # workers train on (they don't deduplicate themselves)
+        shutil.copytree("replies", os.path.join(work_dir, "replies"),
+                        ignore=lambda path, names: [
+                            name for name in names
+                            if name not in (f"{username}.txt", "dedup")])
+
+        workers = [f"localhost:{_free_port()}" for _ in range(num_workers)]
+        train_py = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "train.py")
+        processes = []
+        for index in range(num_workers):
+            tf_config = {"cluster": {"worker": workers},
+                         "task": {"type": "worker", "index": index}}
+            # CPU only, so that the workers don't fight over a GPU
+            env = dict(os.environ, TF_CONFIG=json.dumps(tf_config),
+                       CUDA_VISIBLE_DEVICES="-1")
+            processes.append(subprocess.Popen(
+                [sys.executable, train_py, username,
+                 "--distribute", "multi_worker", *train_args],
+                cwd=work_dir, env=env))
+
+        for process in processes:
+            if process.wait() != 0:
+                raise RuntimeError(f"A worker of the {num_workers}-worker"
+                                   " cluster failed")
+
+        with open(os.path.join(work_dir, "saved_models", "manifest.json"),
+                  "r", encoding="utf-8") as fh:
+            return json.load(fh)[f"{username}_model"]["metrics"]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.epochs < 2:
+        # the first epoch is not timed
+        parser.error("--epochs must be at least 2")
+
+    # the workers train on the deduplicated replies if there are any
+    replies_path = _deduped_path(args.username)
+    if not os.path.exists(replies_path):
+        replies_path = os.path.join("replies", f"{args.username}.txt")
+    with open(replies_path, "r", encoding="utf-8") as fh:
+        num_chars = len(fh.read())
+    train_chars = num_chars * (1 - args.val_frac)
+
+    train_args = ["--epochs", str(args.epochs),
+                  "--seq-length", str(args.seq_length),
+                  "--batch-size", str(args.batch_size),
+                  "--val-frac", str(args.val_frac)]
+
+    rows = []
+    for num_workers in map(int, args.workers.split(",")):
+        logging.info(f"{num_workers} worker ile eğitiliyor..")
+        metrics = run_cluster(num_workers, args.username, train_args)
+        # only the epochs after the first are timed (see train.py)
+        chars_per_sec = (train_chars * metrics["timed_epochs"]
+                         / metrics["train_seconds"])
+        rows.append((num_workers, metrics["train_seconds"], chars_per_sec))
+
+    base = rows[0][2]
+    print(f"{'workers':>8} {'seconds':>10} {'chars/sec':>12} {'speedup':>8}")
+    for num_workers, seconds, chars_per_sec in rows:
+        print(f"{num_workers:>8} {seconds:>10.1f} {chars_per_sec:>12.0f}"
+              f" {chars_per_sec / base:>8.2f}")
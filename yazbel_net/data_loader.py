@@ -2,30 +2,84 @@
 # kaydedildiğini varsayıp ilgili dosyayı bir veri setine çevirmeye yarayan
 # fonksiyonlar dizisinin olduğu yer.
 
+import hashlib
 import os
+import unicodedata
+from collections import Counter
 
 import numpy as np
 import tensorflow as tf
 
+from dedup import _deduped_path
 
-def _get_text(username):
+# the character that stands for all the characters that didn't make it into
+# the vocabulary (rare emoji, box-drawing characters etc.); always the last id
+UNK = "\ufffd"
+
+
+def _normalize(text, normalization=None):
+    """
+    Unicode-normalizes the text e.g. with "NFKC" compatibility characters
+    such as "ﬁ" or full-width letters become their plain counterparts.
+
+    Parameters
+    -----------
+    text: str
+        the text to normalize
+
+    normalization: str, optional, default=None
+        one of "NFC", "NFKC", "NFD", "NFKD"; None means no normalization
+
+    Returns
+    --------
+        The normalized text
+    """
+    if normalization is None:
+        return text
+    return unicodedata.normalize(normalization, text)
+
+
+def _get_text(username, normalization=None):
     """
     Given the username, open up the corresponding file in ./replies dir and
-    slurp.
+    slurp. The deduplicated replies (see `dedup.dedup_replies`) are read if
+    there are any, the raw ones otherwise.
 
     Parameters
     -----------
     username: str
         the username whose replies are wanted
 
+    normalization: str, optional, default=None
+        Unicode normalization to apply, see `_normalize`
+
     Returns
     --------
         The contents of the file read
     """
-    path_to_text = os.path.join("replies", f"{username}.txt")
+    path_to_text = _deduped_path(username)
+    if not os.path.exists(path_to_text):
+        path_to_text = os.path.join("replies", f"{username}.txt")
     with open(path_to_text, "r", encoding="utf-8") as fh:
         text = fh.read()
-    return text
+    return _normalize(text, normalization)
+
+
+def _hash_text(text):
+    """
+    Content hash of a text; used to tell whether a corpus (or a vocabulary)
+    has changed since the last training without looking at the model.
+
+    Parameters
+    -----------
+    text: str
+        the text to hash
+
+    Returns
+    --------
+        sha256 hex digest of the utf-8 encoded text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
 def _input_target_maker(seq):
@@ -48,23 +102,50 @@ def _input_target_maker(seq):
     return inp_txt, tar_txt
 
 
-def _prepare_mappers(text):
+def _prepare_mappers(text, min_count=1, max_size=None):
     """
     Given a text, extracts the vocabulary i.e. unique set of characters and
     makes 2 mappings: from characters to numbers and vice versa. Numbers simply
     start from 0 and end at vocab_size-1.
 
+    Characters seen less than `min_count` times, and the least frequent ones
+    beyond `max_size`, are left out; they all map to the `UNK` id, which is
+    the last one. Rare characters would otherwise inflate the embedding and
+    the softmax for no good.
+
     Parameters
     -----------
     text: str
         The text under investigation
 
+    min_count: int, optional, default=1
+        minimum number of occurrences for a character to get its own id
+
+    max_size: int, optional, default=None
+        maximum size of the vocabulary, `UNK` included; None means no limit,
+        otherwise it has to be at least 2 (UNK and one real character)
+
     Returns
     --------
         2-tuple of mappings (char2num, num2char)
     """
+    if max_size is not None and max_size < 2:
+        raise ValueError("The vocabulary can't be smaller than 2 (UNK and"
+                         f" a character), got max_size={max_size}")
+
+    counts = Counter(text)
+
     # preserve order! (>= py3.7)
-    vocab = dict.fromkeys(text).keys()
+    vocab = [char for char in dict.fromkeys(text)
+             if counts[char] >= min_count and char != UNK]
+
+    # keep the most frequent ones (ties go to the earlier seen), still in
+    # the order of appearance
+    if max_size is not None and len(vocab) > max_size - 1:
+        frequent = set(sorted(vocab, key=counts.get,
+                              reverse=True)[:max_size-1])
+        vocab = [char for char in vocab if char in frequent]
+    vocab.append(UNK)
 
     # Many models don't see words, they see numbers
     char2num = {char: num for num, char in enumerate(vocab)}
@@ -75,6 +156,71 @@ def _prepare_mappers(text):
     return char2num, num2char
 
 
+def _vocab_kwargs(args):
+    """
+    The vocabulary options (`--vocab-min-count`, `--vocab-max-size`,
+    `--unicode-normalization` of train.py) in `args` as keyword arguments of
+    `make_dataset`. Configs saved before these options existed get the
+    defaults.
+
+    Parameters
+    -----------
+    args: argparse.Namespace
+        training arguments, e.g. read from the saved config
+
+    Returns
+    --------
+        dict with the keys "min_count", "max_size" and "normalization"
+    """
+    return {"min_count": getattr(args, "vocab_min_count", 1),
+            "max_size": getattr(args, "vocab_max_size", None),
+            "normalization": getattr(args, "unicode_normalization", None)}
+
+
+def _load_mappers(username, args):
+    """
+    The mappers of the model trained with `args` i.e. with its vocabulary
+    options, see `_vocab_kwargs`.
+
+    Parameters
+    -----------
+    username: str
+        should be such that "./replies/{username}.txt" exists
+
+    args: argparse.Namespace
+        training arguments, e.g. read from the saved config
+
+    Returns
+    --------
+        2-tuple of mappings (char2num, num2char)
+    """
+    kwargs = _vocab_kwargs(args)
+    text = _get_text(username, normalization=kwargs["normalization"])
+    return _prepare_mappers(text, min_count=kwargs["min_count"],
+                            max_size=kwargs["max_size"])
+
+
+def _encode(text, char2num):
+    """
+    Maps the text to numbers with `char2num`; characters out of the
+    vocabulary become `UNK`.
+
+    Parameters
+    -----------
+    text: str
+        The text to map
+
+    char2num: dict
+        mapping from characters to numbers, as of `_prepare_mappers`
+
+    Returns
+    --------
+        np.ndarray of the numbers
+    """
+    unk_num = char2num[UNK]
+    return np.array([char2num.get(char, unk_num) for char in text])
+
+
 def _train_val_split(dataset, val_frac):
     """
     Splits tf.data.Dataset to training and validation sets
@@ -111,7 +257,9 @@ def _train_val_split(dataset, val_frac):
     return train_ds, val_ds
 
 
-def make_dataset(username, val_frac=0.1, seq_length=100, batch_size=64):
+def make_dataset(username, val_frac=0.1, seq_length=100, batch_size=64,
+                 num_shards=1, shard_index=0, min_count=1, max_size=None,
+                 normalization=None):
     """
     Prepares the dataset to train on for the username.
 
@@ -134,14 +282,30 @@ def make_dataset(username, val_frac=0.1, seq_length=100, batch_size=64):
         of course).
 
     batch_size: int, optional, default=64
-        how many samples should be propagated together in one iteration
+        how many samples should be propagated together in one iteration (per
+        worker, if sharded)
+
+    num_shards: int, optional, default=1
+        number of workers the data is split among in multi-worker training.
+        Each worker gets an equal number of sequences so that all of them
+        run the same number of steps per epoch.
+
+    shard_index: int, optional, default=0
+        which shard (i.e. the index of the worker) to return
+
+    min_count, max_size: optional
+        vocabulary limits, see `_prepare_mappers`
+
+    normalization: str, optional, default=None
+        Unicode normalization of the text, see `_normalize`
     """
     # read in the text and get the relate mappers
-    text = _get_text(username)
-    char2num, num2char = _prepare_mappers(text)
+    text = _get_text(username, normalization=normalization)
+    char2num, num2char = _prepare_mappers(text, min_count=min_count,
+                                          max_size=max_size)
 
     # Map the whole text with char2num
-    all_text_numed = np.array([char2num[char] for char in text])
+    all_text_numed = _encode(text, char2num)
 
     # tensorflow dataset all of a sudden :)
     dataset = tf.data.Dataset.from_tensor_slices(all_text_numed)
@@ -150,16 +314,37 @@ def make_dataset(username, val_frac=0.1, seq_length=100, batch_size=64):
     # The dataset was a long series of integers; now we "batch" sequences
     sequences = dataset.batch(seq_length+1, drop_remainder=True)
 
+    # each worker takes every `num_shards`th sequence; the tail is dropped so
+    # that the shards are equally sized (otherwise workers would wait forever
+    # for the one with an extra batch)
+    if num_shards > 1:
+        num_sequences = len(all_text_numed) // (seq_length+1)
+        sequences = sequences.take(num_sequences - num_sequences % num_shards)
+        sequences = sequences.shard(num_shards, shard_index)
+
     # apply the sliding window-like scheme
     dataset = sequences.map(_input_target_maker)
 
-    # Now we shuffle the data and pack into batches
-    # note that this batching is different than batching done previously :)
-    dataset = dataset.shuffle(buffer_size=10_000)
-    dataset = dataset.batch(batch_size, drop_remainder=True)
-    dataset = dataset.prefetch(buffer_size=tf.data.experimental.AUTOTUNE)
-
-    # Split into training and validation based on validation fraction
+    # Split into training and validation based on validation fraction. This
+    # is done on the sequences before shuffling, so that the validation set
+    # is the same in every epoch and never ends up in training.
     train_ds, val_ds = _train_val_split(dataset, val_frac)
 
+    # Now we shuffle the training data and pack both into batches
+    # note that this batching is different than batching done previously :)
+    train_ds = train_ds.shuffle(buffer_size=10_000)
+    train_ds = train_ds.batch(batch_size, drop_remainder=True)
+    train_ds = train_ds.prefetch(buffer_size=tf.data.experimental.AUTOTUNE)
+
+    val_ds = val_ds.batch(batch_size, drop_remainder=True)
+    val_ds = val_ds.prefetch(buffer_size=tf.data.experimental.AUTOTUNE)
+
+    # we shard by hand above, so tf.distribute should not shard once more
+    if num_shards > 1:
+        options = tf.data.Options()
+        options.experimental_distribute.auto_shard_policy = \
+            tf.data.experimental.AutoShardPolicy.OFF
+        train_ds = train_ds.with_options(options)
+        val_ds = val_ds.with_options(options)
+
     return train_ds, val_ds, (char2num, num2char)
@@ -0,0 +1,218 @@
+# Kullanıcının yanıtlarının kaydedildiği dosyadan tekrar eden ve neredeyse
+# aynı olan blokları (alıntılar, imzalar, kopyala-yapıştır kodlar) ayıklayan
+# fonksiyonların olduğu yer. Veri setinin oluşturulmasından önce çalışır;
+# forumdan çekilen ham dosyaya dokunmaz, ayıklanmış metni ayrı bir dosyaya
+# yazar.
+
+import logging
+import os
+import zlib
+
+import numpy as np
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
+# Mersenne prime 2^31 - 1; (a * x + b) mod p is the family of hash functions
+# whose minimums give the MinHash signature. Since a < 2^31 and x < 2^32, the
+# products fit in uint64.
+_PRIME = (1 << 31) - 1
+
+# the deduplicated replies are kept apart from the raw scrape, so that the
+# deduplication can be rerun (e.g. with another threshold) or turned off
+_DEDUP_DIR = os.path.join("replies", "dedup")
+
+
+def _deduped_path(username):
+    """
+    Path of the deduplicated replies of the user; `data_loader._get_text`
+    reads this instead of "replies/{username}.txt" when it exists.
+    """
+    return os.path.join(_DEDUP_DIR, f"{username}.txt")
+
+
+def _split_blocks(text):
+    """
+    Splits the replies text into blocks i.e. paragraphs separated by empty
+    lines. `write_replies` separates replies that way, and quotes, signatures
+    and code snippets are paragraphs on their own within replies too.
+
+    Parameters
+    -----------
+    text: str
+        the text to split
+
+    Returns
+    --------
+        list of blocks (str)
+    """
+    return text.split("\n\n")
+
+
+def _collapse_whitespace(block):
+    """
+    Collapses runs of whitespace into single spaces (and strips the ends), so
+    that re-indented copies of a block look the same.
+    """
+    return " ".join(block.split())
+
+
+def _shingles(block, k):
+    """
+    Set of hashed character k-grams ("shingles") of the block.
+
+    Parameters
+    -----------
+    block: str
+        the block to shingle, whitespace-collapsed and at least `k` long
+
+    k: int
+        the length of the shingles
+
+    Returns
+    --------
+        np.ndarray of unique uint64 hashes of the shingles
+    """
+    return np.unique(np.array(
+                [zlib.crc32(block[i:i+k].encode("utf-8"))
+                 for i in range(len(block) - k + 1)],
+                dtype=np.uint64))
+
+
+def _minhash(shingles, coeffs_a, coeffs_b):
+    """
+    MinHash signature of a set of shingles: for each of the hash functions,
+    the minimum hash value over the set. The fraction of equal entries of two
+    signatures estimates the Jaccard similarity of the two sets.
+
+    Parameters
+    -----------
+    shingles: np.ndarray
+        hashed shingles of a block
+
+    coeffs_a, coeffs_b: np.ndarray
+        coefficients of the hash functions (a * x + b) mod p
+
+    Returns
+    --------
+        np.ndarray of shape (num_perm,)
+    """
+    hashed = (coeffs_a[:, None] * shingles[None, :]
+              + coeffs_b[:, None]) % _PRIME
+    return hashed.min(axis=1)
+
+
+def dedup_text(text, threshold=0.8, k=5, num_perm=128, bands=32,
+               min_length=50, seed=0):
+    """
+    Removes exact and near-duplicate blocks from the text, keeping the first
+    occurrence. Candidate duplicates are found with locality sensitive hashing
+    (LSH) on MinHash signatures, so each block is only compared with the few
+    earlier blocks that share an LSH bucket with it rather than with all of
+    them.
+
+    Parameters
+    -----------
+    text: str
+        the replies text
+
+    threshold: float, optional, default=0.8
+        a block is dropped if its estimated Jaccard similarity to an earlier
+        kept block is at least this much
+
+    k: int, optional, default=5
+        the length of the character shingles
+
+    num_perm: int, optional, default=128
+        the number of hash functions i.e. the length of the signatures
+
+    bands: int, optional, default=32
+        the number of LSH bands; must divide `num_perm`. More bands means
+        more candidates (fewer missed duplicates) but more comparisons.
+
+    min_length: int, optional, default=50
+        blocks shorter than this once whitespace is collapsed (e.g. a lone
+        "}" of a code snippet or "Teşekkürler") are always kept
+
+    seed: int, optional, default=0
+        seed of the hash functions, so that the result is reproducible
+
+    Returns
+    --------
+        2-tuple of (deduplicated text, number of characters removed)
+    """
+    rng = np.random.RandomState(seed)
+    coeffs_a = rng.randint(1, _PRIME, size=num_perm).astype(np.uint64)
+    coeffs_b = rng.randint(0, _PRIME, size=num_perm).astype(np.uint64)
+    rows = num_perm // bands
+
+    # (band index, band of the signature) -> indices of the kept signatures
+    buckets = {}
+    signatures = []
+    kept = []
+    for block in _split_blocks(text):
+        # lengths are checked on what gets shingled; e.g. indented blank
+        # lines of pasted code collapse to (almost) nothing
+        collapsed = _collapse_whitespace(block)
+        if len(collapsed) < max(min_length, k):
+            kept.append(block)
+            continue
+
+        signature = _minhash(_shingles(collapsed, k), coeffs_a, coeffs_b)
+        keys = [(band, signature[band*rows:(band+1)*rows].tobytes())
+                for band in range(bands)]
+
+        candidates = {idx for key in keys for idx in buckets.get(key, ())}
+        if any(np.mean(signatures[idx] == signature) >= threshold
+               for idx in candidates):
+            continue
+
+        for key in keys:
+            buckets.setdefault(key, []).append(len(signatures))
+        signatures.append(signature)
+        kept.append(block)
+
+    deduped = "\n\n".join(kept)
+    return deduped, len(text) - len(deduped)
+
+
+def dedup_replies(username, threshold=0.8):
+    """
+    Removes the near-duplicate blocks of "replies/{username}.txt" and writes
+    the rest to `_deduped_path(username)`; the raw file is left as is. Reports
+    how many characters are removed.
+
+    Parameters
+    -----------
+    username: str
+        should be such that "./replies/{username}.txt" exists
+
+    threshold: float, optional, default=0.8
+        see `dedup_text`
+
+    Returns
+    --------
+        number of characters removed
+    """
+    path_to_file = os.path.join("replies", f"{username}.txt")
+    with open(path_to_file, "r", encoding="utf-8") as fh:
+        text = fh.read()
+
+    deduped, num_removed = dedup_text(text, threshold=threshold)
+
+    os.makedirs(_DEDUP_DIR, exist_ok=True)
+    with open(_deduped_path(username), "w", encoding="utf-8") as fh:
+        fh.write(deduped)
+
+    logging.info(f"Removed {num_removed} of {len(text)} characters"
+                 f" ({num_removed / max(len(text), 1):.1%}) as near-duplicate"
+                 " replies")
+    return num_removed
+
+
+def remove_deduped(username):
+    """
+    Removes the deduplicated replies of the user, if any, so that the raw
+    "replies/{username}.txt" is trained on again.
+    """
+    if os.path.exists(_deduped_path(username)):
+        os.remove(_deduped_path(username))
@@ -0,0 +1,299 @@
+# Eğitilmiş (büyük) bir YazbelNet'in bilgisini daha küçük ve dolayısıyla
+# metin üretiminde daha hızlı bir YazbelNet'e "damıtan" (knowledge
+# distillation) sınıf ve `python train.py distill` alt komutunun olduğu yer.
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import tensorflow as tf
+
+from data_loader import _vocab_kwargs, make_dataset
+from network import (YazbelNet, _load_model, _make_manifest_entry,
+                     _update_manifest)
+from text_generator import TextGenerator, export_generator
+
+logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
+
+
+class Distiller(tf.keras.Model):
+    """
+    Öğretmen (teacher) modelin hararetle yumuşatılmış çıktılarını taklit
+    ederek öğrenci (student) modeli eğitir. Öğretmen eğitilmez.
+    """
+    def __init__(self, student, teacher, temperature=2., alpha=0.1):
+        """
+        Parameters
+        -----------
+        student: network.YazbelNet
+            Eğitilecek olan (küçük) model
+
+        teacher: network.YazbelNet
+            Halihazırda eğitilmiş olduğu varsayılan (büyük) model
+
+        temperature: float, opsiyonel, varsayılan=2.
+            Her iki modelin logit'leri bu sayıya bölünüp öyle olasılığa
+            çevrilir; 1'den büyük olması öğretmenin "ikinci, üçüncü
+            tahminleri" hakkındaki bilgiyi de öğrenciye aktarır.
+
+        alpha: float, opsiyonel, varsayılan=0.1
+            Kaybın ne kadarının gerçek hedef karakterlerden (geri kalanı
+            öğretmenden) geleceği
+        """
+        super().__init__(self)
+        self.student = student
+        self.teacher = teacher
+        self.temperature = temperature
+        self.alpha = alpha
+
+        self.student_loss_fn = tf.keras.losses.SparseCategoricalCrossentropy(
+                                                        from_logits=True)
+        self.distillation_loss_fn = tf.keras.losses.KLDivergence()
+
+        # epoch boyunca ortalama alınsın diye
+        self.loss_tracker = tf.keras.metrics.Mean(name="loss")
+        self.student_loss_tracker = tf.keras.metrics.Mean(name="student_loss")
+        self.distillation_loss_tracker = tf.keras.metrics.Mean(
+                                                    name="distillation_loss")
+
+    @property
+    def metrics(self):
+        # her epoch başında Keras'ın bunları sıfırlayabilmesi için
+        return [self.loss_tracker, self.student_loss_tracker,
+                self.distillation_loss_tracker]
+
+    def train_step(self, data):
+        """
+        Bir alt dönüşte öğrenciyi hem gerçek hedeflere hem de öğretmenin
+        yumuşatılmış dağılımına yaklaştırır.
+        """
+        x, y = data
+        teacher_logits = self.teacher(x, training=False)
+
+        with tf.GradientTape() as tape:
+            student_logits = self.student(x, training=True)
+            student_loss = self.student_loss_fn(y, student_logits)
+            # T^2 ile çarpım: gradyanların ölçeği hararetten bağımsız olsun
+            distillation_loss = self.distillation_loss_fn(
+                tf.nn.softmax(teacher_logits / self.temperature),
+                tf.nn.softmax(student_logits / self.temperature)
+            ) * self.temperature ** 2
+            loss = (self.alpha * student_loss
+                    + (1 - self.alpha) * distillation_loss)
+
+        variables = self.student.trainable_variables
+        gradients = tape.gradient(loss, variables)
+        self.optimizer.apply_gradients(zip(gradients, variables))
+
+        self.loss_tracker.update_state(loss)
+        self.student_loss_tracker.update_state(student_loss)
+        self.distillation_loss_tracker.update_state(distillation_loss)
+        return {metric.name: metric.result() for metric in self.metrics}
+
+    def test_step(self, data):
+        """
+        Validasyonda sadece öğrencinin gerçek hedeflerdeki kaybına bakılır,
+        böylece `val_loss` öğretmeninkiyle karşılaştırılabilir olur.
+        """
+        x, y = data
+        student_loss = self.student_loss_fn(y, self.student(x,
+                                                            training=False))
+        self.loss_tracker.update_state(student_loss)
+        return {"loss": self.loss_tracker.result()}
+
+    def train(self, train_ds, val_ds=None, optimizer="adam", epochs=20,
+              es_patience=5):
+        """
+        `YazbelNet.train`in damıtma için olanı; parametreler aynı anlamda.
+        """
+        early_stop = tf.keras.callbacks.EarlyStopping(monitor="val_loss",
+                                                      patience=es_patience,
+                                                      mode="min")
+        self.compile(optimizer=optimizer)
+        self.fit(train_ds, epochs=epochs, validation_data=val_ds,
+                 callbacks=[early_stop])
+
+        return self
+
+
+def _validation_loss(model, val_ds):
+    """
+    `model`in `val_ds` üzerindeki (gerçek hedeflere göre) ortalama kaybı.
+    """
+    model.compile(loss=tf.keras.losses.SparseCategoricalCrossentropy(
+                                                        from_logits=True))
+    return model.evaluate(val_ds, verbose=0)
+
+
+def _sampling_speed(model, char2num, num2char, length, normalization=None):
+    """
+    `model`le `sample_text`in saniyede kaç karakter ürettiği. Önce kısa bir
+    ısınma turu atılır ki `tf.function` izleme (tracing) süresi ölçüme
+    girmesin.
+    """
+    gen = TextGenerator(model, char2num, num2char,
+                        normalization=normalization)
+    gen.sample_text(length=2)
+
+    start = time.perf_counter()
+    gen.sample_text(length=length)
+    return length / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    """
+    `python train.py distill username [--options]`ın giriş noktası.
+    """
+    parser = argparse.ArgumentParser(
+                    prog="train.py distill",
+                    # let's show the defaults in --help too
+                    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("username",
+                        help="yazbel kullanıcı adı; modeli eğitilmiş olmalı")
+
+    parser.add_argument("--embedding-dim",
+                        help="öğrencide kelimeler kaç boyutta temsil edilsin?",
+                        type=int,
+                        default=64)
+
+    parser.add_argument("--rnn-hidden-units",
+                        help="öğrencinin RNN'i kaç gizli birim kullansın?",
+                        type=int,
+                        default=64)
+
+    parser.add_argument("--temperature",
+                        help="damıtma harareti kaç olsun?",
+                        type=float,
+                        default=2.)
+
+    parser.add_argument("--alpha",
+                        help="kaybın ne kadarı gerçek hedeflerden gelsin?",
+                        type=float,
+                        default=0.1)
+
+    parser.add_argument("--seq-length",
+                        help="model kaç karakter geriye baksın? verilmezse"
+                             " öğretmeninki; farklı olamaz",
+                        type=int,
+                        default=None)
+
+    parser.add_argument("--batch-size",
+                        help="bir alt dönüşte kaç numune işlensin?",
+                        type=int,
+                        default=4)
+
+    parser.add_argument("--optimizer",
+                        help="eniyileştirici ne olsun?",
+                        default="adam")
+
+    parser.add_argument("--epochs",
+                        help="veri üzerinde *en fazla* kaç tam tur dönülsün?",
+                        type=int,
+                        default=20)
+
+    parser.add_argument("--val-frac",
+                        help="verinin ne kadarlık fraksiyonu validasyona"
+                             " gitsin? verilmezse öğretmeninki; farklı olamaz",
+                        type=float,
+                        default=None)
+
+    parser.add_argument("--es-patience",
+                        help="erken duruş için kaç tam tur sabredilsin?",
+                        type=int,
+                        default=5)
+
+    parser.add_argument("--sample-length",
+                        help="hız karşılaştırmasında kaç karakter üretilsin?",
+                        type=int,
+                        default=500)
+
+    args = parser.parse_args(argv)
+    username = args.username
+
+    teacher_path = os.path.join("saved_models", f"{username}_model")
+    if not os.path.exists(teacher_path + ".index"):
+        logging.error("You need to train the model first and then distill!")
+        return
+
+    # the teacher
+    with open(os.path.join("saved_models", f"{username}_config.txt"),
+              "r") as fh:
+        teacher_args = argparse.Namespace(**json.load(fh))
+    teacher = _load_model(username, teacher_args, teacher_path)
+    teacher.trainable = False
+    logging.info("Öğretmen model diskten yüklendi")
+
+    # the validation split is made on sequences of seq_length+1 characters,
+    # so only the teacher's seq_length and val_frac give a validation set
+    # the teacher has never trained on
+    for name in ("seq_length", "val_frac"):
+        teacher_value = getattr(teacher_args, name)
+        if getattr(args, name) is None:
+            setattr(args, name, teacher_value)
+        elif getattr(args, name) != teacher_value:
+            logging.error(f"--{name.replace('_', '-')} has to be the"
+                          f" teacher's ({teacher_value}), otherwise the"
+                          " validation set overlaps its training data")
+            return
+
+    # the student shares the vocabulary of the teacher; recorded in its
+    # config too so that it can be loaded on its own
+    vocab_kwargs = _vocab_kwargs(teacher_args)
+    args.vocab_min_count = vocab_kwargs["min_count"]
+    args.vocab_max_size = vocab_kwargs["max_size"]
+    args.unicode_normalization = vocab_kwargs["normalization"]
+
+    train_ds, val_ds, (char2num, num2char) = make_dataset(
+                                                    username,
+                                                    val_frac=args.val_frac,
+                                                    seq_length=args.seq_length,
+                                                    batch_size=args.batch_size,
+                                                    **vocab_kwargs
+                                                )
+
+    # the student
+    logging.info("Öğrenci model oluşturuluyor ve damıtma başlıyor..")
+    student = YazbelNet(vocab_size=len(char2num),
+                        embedding_dim=args.embedding_dim,
+                        rnn_hidden_units=args.rnn_hidden_units)
+    distiller = Distiller(student, teacher, temperature=args.temperature,
+                          alpha=args.alpha)
+    distiller.train(train_ds, val_ds=val_ds, optimizer=args.optimizer,
+                    epochs=args.epochs, es_patience=args.es_patience)
+    logging.info("Damıtma tamamlandı")
+
+    # save the student next to the teacher
+    student.save_weights(os.path.join("saved_models",
+                                      f"{username}_student_model"))
+    export_generator(student, char2num,
+                     os.path.join("saved_models",
+                                  f"{username}_student_savedmodel"),
+                     normalization=args.unicode_normalization)
+    with open(os.path.join("saved_models", f"{username}_student_config.txt"),
+              "w") as fh:
+        json.dump(vars(args), fh)
+
+    history = distiller.history.history
+    metrics = {"epochs": len(history["loss"])}
+    metrics.update({name: float(values[-1])
+                    for name, values in history.items()})
+    _update_manifest(f"{username}_student_model",
+                     _make_manifest_entry(username, args, metrics=metrics))
+    logging.info("Öğrenci model kaydedildi")
+
+    # compare the two on one and the same held-out set: the validation split
+    # is fixed and never trained on, and caching it makes sure both models
+    # see the very same batches
+    logging.info("Öğretmen ve öğrenci karşılaştırılıyor..")
+    held_out_ds = val_ds.cache()
+    rows = [(name, _validation_loss(model, held_out_ds),
+             _sampling_speed(model, char2num, num2char, args.sample_length,
+                             normalization=args.unicode_normalization))
+            for name, model in (("teacher", teacher), ("student", student))]
+
+    print(f"{'model':>8} {'val_loss':>10} {'chars/sec':>12}")
+    for name, val_loss, chars_per_sec in rows:
+        print(f"{name:>8} {val_loss:>10.4f} {chars_per_sec:>12.1f}")
@@ -0,0 +1,201 @@
+# Eğitilmiş bir modeli, eğitimde görmediği bir metin üzerinde karakter başına
+# bit (bits-per-character) cinsinden puanlayan CLI. Sonuçlar (model, veri)
+# ikilisinin özetine göre önbelleğe alınır; tekrar eden karşılaştırmalar anında
+# sonuçlanır.
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from data_loader import (UNK, _encode, _hash_text, _load_mappers,
+                         _normalize, _vocab_kwargs)
+from network import _load_model
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
+_CACHE_PATH = os.path.join("saved_models", "eval_cache.json")
+
+# Command line parser
+parser = argparse.ArgumentParser(
+                # let's show the defaults in --help too
+                formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+parser.add_argument("username",
+                    help="yazbel kullanıcı adı")
+
+parser.add_argument("path",
+                    help="modelin puanlanacağı (eğitimde görülmemiş) metin"
+                         " dosyası")
+
+parser.add_argument("--student",
+                    help="`train.py distill` ile damıtılmış küçük model"
+                         " puanlansın",
+                    action="store_true")
+
+parser.add_argument("--batch-size",
+                    help="metin kaç paralel akışa bölünsün?",
+                    type=int,
+                    default=64)
+
+parser.add_argument("--window",
+                    help="her bir adımda akış başına kaç karakter işlensin?",
+                    type=int,
+                    default=256)
+
+parser.add_argument("--no-cache",
+                    help="önbellekteki sonuç kullanılmasın, yeniden"
+                         " hesaplansın",
+                    action="store_true")
+
+
+def _hash_model(model_path):
+    """
+    Content hash of the saved weights i.e. of all the checkpoint files that
+    start with `model_path`.
+    """
+    sha = hashlib.sha256()
+    for path in sorted(glob.glob(model_path + ".*")):
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _read_cache():
+    """
+    Reads the evaluation cache; empty dict if there is none yet.
+    """
+    if not os.path.exists(_CACHE_PATH):
+        return {}
+    with open(_CACHE_PATH, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def evaluate(model, nums, batch_size=64, window=256):
+    """
+    Streams the numericalized text through the model and computes the
+    bits-per-character. The text is cut into `batch_size` contiguous streams
+    which are processed side by side, `window` characters at a time; the RNN
+    state of each stream is carried over from one window to the next, so the
+    result is (nearly) the same as feeding the whole text in one go, only
+    much faster.
+
+    Parameters
+    -----------
+    model: network.YazbelNet
+        the trained model
+
+    nums: np.ndarray
+        the text mapped to numbers with the model's char2num
+
+    batch_size: int, optional, default=64
+        number of streams
+
+    window: int, optional, default=256
+        number of characters per stream per step
+
+    Returns
+    --------
+        3-tuple of (bits-per-character, number of characters scored, seconds
+        spent scoring); the time excludes tracing and a warm-up step
+    """
+    stream_length = len(nums) // batch_size
+    if stream_length < 2:
+        raise ValueError(f"The text is too short for {batch_size} streams")
+    streams = nums[:batch_size * stream_length].reshape(batch_size, -1)
+    # the signature of `step` wants int64 (numpy's default int is int32 on
+    # Windows)
+    streams = streams.astype(np.int64)
+    inputs, targets = streams[:, :-1], streams[:, 1:]
+
+    loss_fn = tf.keras.losses.SparseCategoricalCrossentropy(
+                                    from_logits=True,
+                                    reduction=tf.keras.losses.Reduction.SUM)
+
+    # None time dimension: the shorter last window doesn't retrace
+    @tf.function(input_signature=[
+                    tf.TensorSpec([batch_size, None], tf.int64),
+                    tf.TensorSpec([batch_size, None], tf.int64),
+                    tf.TensorSpec([batch_size, model.rnn_hidden_units],
+                                  tf.float32)])
+    def step(x, y, states):
+        logits, states = model(x, states=states, return_state=True)
+        return loss_fn(y, logits), states
+
+    # starting with explicit zeros (rather than None) spares a retracing
+    states = tf.zeros((batch_size, model.rnn_hidden_units))
+
+    # warm-up on the first window (result thrown away) so that tracing and
+    # the one-off costs of the first call are not timed
+    step(inputs[:, :window], targets[:, :window], states)
+
+    total_nats = 0.
+    start_time = time.perf_counter()
+    for start in range(0, inputs.shape[1], window):
+        nats, states = step(inputs[:, start:start+window],
+                            targets[:, start:start+window], states)
+        total_nats += float(nats)
+    seconds = time.perf_counter() - start_time
+
+    num_chars = targets.size
+    return total_nats / (num_chars * math.log(2)), num_chars, seconds
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    username = args.username
+    model_name = f"{username}_student" if args.student else username
+    model_path = os.path.join("saved_models", f"{model_name}_model")
+    if not os.path.exists(model_path + ".index"):
+        raise SystemExit("You need to train the model first and then"
+                         " evaluate!")
+
+    with open(args.path, "r", encoding="utf-8") as fh:
+        text = fh.read()
+
+    cache_key = (f"{_hash_model(model_path)}:{_hash_text(text)}"
+                 f":{args.batch_size}")
+    cache = _read_cache()
+    if cache_key in cache and not args.no_cache:
+        logging.info("Sonuç önbellekten alındı")
+        result = cache[cache_key]
+    else:
+        config_save_path = os.path.join("saved_models",
+                                        f"{model_name}_config.txt")
+        with open(config_save_path, "r") as fh:
+            net_args = argparse.Namespace(**json.load(fh))
+        model = _load_model(username, net_args, model_path)
+
+        # same vocabulary and normalization as in the training; characters
+        # out of the vocabulary are scored as UNK
+        char2num, _ = _load_mappers(username, net_args)
+        normalization = _vocab_kwargs(net_args)["normalization"]
+        nums = _encode(_normalize(text, normalization), char2num)
+        num_unks = int((nums == char2num[UNK]).sum())
+        if num_unks:
+            logging.info(f"{num_unks} characters of the text are not in the"
+                         " vocabulary and are scored as UNK")
+
+        bpc, num_chars, seconds = evaluate(model, nums,
+                                           batch_size=args.batch_size,
+                                           window=args.window)
+
+        result = {"model": model_name, "path": args.path, "bpc": bpc,
+                  "chars": num_chars, "chars_per_sec": num_chars / seconds}
+        cache[cache_key] = result
+        with open(_CACHE_PATH, "w", encoding="utf-8") as fh:
+            json.dump(cache, fh, indent=4, ensure_ascii=False)
+
+    print(f"model: {result['model']}")
+    print(f"bits-per-character: {result['bpc']:.4f}")
+    print(f"characters: {result['chars']}"
+          f" ({result['chars_per_sec']:.0f} chars/sec)")
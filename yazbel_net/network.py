@@ -3,6 +3,7 @@
 
 import json
 import os
+import time
 
 import tensorflow as tf
 
@@ -90,7 +91,7 @@ class YazbelNet(tf.keras.Model):
 
     def train(self, train_ds, val_ds=None,
               loss="sparse_categorical_crossentropy", optimizer="adam",
-              epochs=20, es_patience=5):
+              epochs=20, es_patience=5, callbacks=None):
         """
         Modelin eğitilmesi prosedürünü bir araya toplayan fonksiyon
 
@@ -119,6 +120,11 @@ class YazbelNet(tf.keras.Model):
         es_patience: int, opsiyonel, varsayılan=5
             Erken duruş (early stopping) için sabredilmesi gereken "epoch"
             yani tam tur sayısı. Ancak `val_ds` `None` değilse anlamlıdır.
+
+        callbacks: list of tf.keras.callbacks.Callback, opsiyonel,
+                        varsayılan=None
+            Erken duruşun yanında `fit`e verilecek diğer callback'ler, örn.
+            `_EpochTimer`.
         """
         # her ne kadar varsayılan olsa da, kendisinin `from_logist`
         # parametresinin varsayılan değeri bize uymuyor onu değiştirelim :)
@@ -132,29 +138,168 @@ class YazbelNet(tf.keras.Model):
         # model derlenir ve "fit" edilir yani esas öğrenmenin merkezi burası
         self.compile(optimizer=optimizer, loss=loss)
         self.fit(train_ds, epochs=epochs, validation_data=val_ds, shuffle=True,
-                 callbacks=[early_stop])
+                 callbacks=[early_stop, *(callbacks or [])])
 
         return self
 
 
-def _check_model(username, current_args):
+class _EpochTimer(tf.keras.callbacks.Callback):
+    """
+    Her bir tam turun eğitim kısmının (validasyon hariç) kaç saniye
+    sürdüğünü `self.seconds` listesine yazar. İlk tur modelin inşası,
+    `tf.function` izlemesi, worker'ların birbirine bağlanması gibi bir
+    kerelik işleri de içerdiğinden hız ölçerken atlanmalıdır.
+    """
+    def __init__(self):
+        super().__init__()
+        self.seconds = []
+        self._start = self._end = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start, self._end = time.perf_counter(), None
+
+    def on_test_begin(self, logs=None):
+        # the validation at the end of the epoch is not timed
+        if self._start is not None and self._end is None:
+            self._end = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.seconds.append((self._end or time.perf_counter()) - self._start)
+        self._start = None
+
+    def steady_seconds(self):
+        """
+        2-tuple of (seconds of the epochs after the first, their number);
+        seconds is None if there was only one epoch.
+        """
+        steady = self.seconds[1:]
+        return (sum(steady) if steady else None), len(steady)
+
+
+def _get_strategy(name):
+    """
+    İsmi verilen `tf.distribute` stratejisini döner.
+
+    Parameters
+    -----------
+    name: str
+        "none": tek süreç, varsayılan strateji
+        "mirrored": tek makinedeki tüm cihazlarda (GPU'lar) veri paralelliği
+        "multi_worker": birden fazla süreç / makinede veri paralelliği. Küme
+            bilgisi `TF_CONFIG` ortam değişkeninden okunur. Diğer TF
+            işlemlerinden önce oluşturulmalıdır!
+
+    Returns
+    --------
+        4-tuple of (strateji, eğitime katılan süreç sayısı, bu sürecin veri
+        parçasının indisi, bu süreç "chief" mi)
+    """
+    if name == "mirrored":
+        return tf.distribute.MirroredStrategy(), 1, 0, True
+    if name == "multi_worker":
+        strategy = tf.distribute.MultiWorkerMirroredStrategy()
+        resolver = strategy.cluster_resolver
+        cluster = resolver.cluster_spec().as_dict()
+        # the chief (if any) trains too, so it gets a shard of its own; the
+        # shards are numbered chief first, then the workers
+        num_chiefs = len(cluster.get("chief", []))
+        num_workers = num_chiefs + len(cluster.get("worker", []))
+        task_type, task_id = resolver.task_type, resolver.task_id or 0
+        shard_index = task_id + (num_chiefs if task_type == "worker" else 0)
+        # as in the multi worker guide of TF: the chief, or the first worker
+        # if the cluster has no chief (or there is no cluster at all)
+        is_chief = (task_type in ("chief", None)
+                    or (task_type == "worker" and num_chiefs == 0
+                        and task_id == 0))
+        return strategy, max(num_workers, 1), shard_index, is_chief
+    return tf.distribute.get_strategy(), 1, 0, True
+
+
+# modelin mimarisini belirleyen argümanlar; sadece bunlar değişirse (ya da
+# veri değişirse) yeniden eğitim gerekir. --epochs, --driver-path vb. değil.
+_ARCH_KEYS = ("embedding_dim", "rnn_hidden_units")
+
+_MANIFEST_PATH = os.path.join("saved_models", "manifest.json")
+
+
+def _read_manifest():
+    """
+    `saved_models/manifest.json`ı okur; yoksa boş sözlük döner. Manifest,
+    model adından (örn. "trdjango_model") o modelin mimari konfigürasyonu,
+    eğitildiği verinin ve sözlüğün özetleri (hash) ile eğitim metriklerine
+    giden bir eşlemedir.
+    """
+    if not os.path.exists(_MANIFEST_PATH):
+        return {}
+    with open(_MANIFEST_PATH, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _make_manifest_entry(username, args, metrics=None):
+    """
+    `args`la eğitilmiş bir model için manifest girdisi hazırlar.
+
+    Parameters
+    -----------
+    username: str
+        "./replies/{username}.txt" kullanıcının derlemi (corpus)
+
+    args: argparse.Namespace
+        en azından `_ARCH_KEYS`deki argümanları içeren konfigürasyon; sözlük
+        seçenekleri de (`data_loader._vocab_kwargs`) buradan okunur
+
+    metrics: dict, opsiyonel, varsayılan=None
+        eğitimden elde edilen metrikler örn. {"loss": 1.2, "val_loss": 1.4}
+
+    Returns
+    --------
+        manifest'e yazılacak sözlük
+    """
+    from data_loader import (_get_text, _hash_text, _prepare_mappers,
+                             _vocab_kwargs)
+    vocab_kwargs = _vocab_kwargs(args)
+    text = _get_text(username, normalization=vocab_kwargs["normalization"])
+    char2num, _ = _prepare_mappers(text, min_count=vocab_kwargs["min_count"],
+                                   max_size=vocab_kwargs["max_size"])
+    return {"config": {key: getattr(args, key) for key in _ARCH_KEYS},
+            "corpus_hash": _hash_text(text),
+            "vocab_hash": _hash_text("".join(char2num)),
+            "vocab_size": len(char2num),
+            "metrics": metrics or {}}
+
+
+def _update_manifest(model_name, entry):
+    """
+    `model_name` için manifest girdisini yazar (varsa üzerine yazar).
+    """
+    manifest = _read_manifest()
+    manifest[model_name] = entry
+    with open(_MANIFEST_PATH, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=4, ensure_ascii=False)
+
+
+def _check_model(username, current_args, model_name=None):
     """
-    Diskten yüklenen `model` şu anki çalıştırılmaya çalışılan modelle aynı
-    konfigürasyona mı sahip?
+    Diskteki model şu anki çalıştırılmaya çalışılan modelle aynı mimariye
+    sahip ve aynı veri üzerinde mi eğitilmiş? Sadece manifest'e bakar, modeli
+    (ağırlıkları) yüklemez.
     """
-    config_save_path = os.path.join("saved_models", f"{username}_config.txt")
-    with open(config_save_path, "r") as fh:
-        old_config_dict = json.load(fh)
-    return vars(current_args) == old_config_dict
+    model_name = model_name or f"{username}_model"
+    old_entry = _read_manifest().get(model_name)
+    if old_entry is None:
+        return False
+    new_entry = _make_manifest_entry(username, current_args)
+    return all(old_entry[key] == new_entry[key]
+               for key in ("config", "corpus_hash", "vocab_hash"))
 
 
 def _load_model(username, net_args, model_path):
     """
     Diskten model yükler.
     """
-    # get mappers
-    from data_loader import _get_text, _prepare_mappers
-    char2num, _ = _prepare_mappers(_get_text(username))
+    # get mappers (with the vocabulary options the model is trained with)
+    from data_loader import _load_mappers
+    char2num, _ = _load_mappers(username, net_args)
 
     # make model and load the weights to it
     model = YazbelNet(vocab_size=len(char2num),
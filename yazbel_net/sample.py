@@ -6,9 +6,9 @@ import json
 import logging
 import os
 
-from data_loader import _get_text, _prepare_mappers
+from data_loader import _load_mappers, _vocab_kwargs
 from network import _load_model
-from text_generator import TextGenerator
+from text_generator import SavedModelGenerator, TextGenerator
 
 logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
 
@@ -33,35 +33,57 @@ parser.add_argument("--temperature",
                     help="üretilen tekstin harareti kaç olsun?",
                     type=float,
                     default=0.5)
+parser.add_argument("--student",
+                    help="`train.py distill` ile damıtılmış küçük (ve hızlı)"
+                         " model kullanılsın",
+                    action="store_true")
+
+parser.add_argument("--savedmodel",
+                    help="eğitimde dışa aktarılan SavedModel kullanılsın;"
+                         " model inşa edilmediği için ilk karakter daha"
+                         " çabuk gelir",
+                    action="store_true")
 args = parser.parse_args()
 
 username = args.username
-model_path = os.path.join("saved_models", f"{username}_model")
-if not os.path.exists(model_path + ".index"):
+model_name = f"{username}_student" if args.student else username
+model_path = os.path.join("saved_models", f"{model_name}_model")
+export_path = os.path.join("saved_models", f"{model_name}_savedmodel")
+if args.savedmodel:
+    if not os.path.exists(export_path):
+        logging.error("You need to train the model first and then sample!")
+    else:
+        gen = SavedModelGenerator(export_path, temperature=args.temperature)
+        logging.info("SavedModel diskten yüklendi")
+
+        generated_text = gen.sample_text(length=args.length, seed=args.seed)
+
+        print("Üretilen metin:", end="\n"+"-"*40+"\n"*2)
+        print(generated_text)
+elif not os.path.exists(model_path + ".index"):
     logging.error("You need to train the model first and then sample!")
 else:
     logging.info("Model bulundu, yükleniyor..")
 
     # get configs first
-    config_save_path = os.path.join("saved_models", f"{username}_config.txt")
+    config_save_path = os.path.join("saved_models", f"{model_name}_config.txt")
     with open(config_save_path, "r") as fh:
-        config_dict = json.load(fh)
-    args.embedding_dim = config_dict["embedding_dim"]
-    args.rnn_hidden_units = config_dict["rnn_hidden_units"]
+        net_args = argparse.Namespace(**json.load(fh))
 
     # load the model
-    model = _load_model(username, args, model_path)
+    model = _load_model(username, net_args, model_path)
 
     logging.info("Model diskten yüklendi")
 
-    # get the mappers
-    char2num, num2char = _prepare_mappers(_get_text(username))
+    # get the mappers (with the vocabulary options of the training)
+    char2num, num2char = _load_mappers(username, net_args)
 
     # text generation!
     logging.info("Metin üretiliyor..")
 
     gen = TextGenerator(model, char2num, num2char,
-                        temperature=args.temperature)
+                        temperature=args.temperature,
+                        normalization=_vocab_kwargs(net_args)["normalization"])
     generated_text = gen.sample_text(length=args.length, seed=args.seed)
 
     print("Üretilen metin:", end="\n"+"-"*40+"\n"*2)
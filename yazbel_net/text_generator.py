@@ -1,19 +1,46 @@
 # Eğitilmiş bir YazbelNet üzerinden tekst üretimi yapmaya olanak sağlayan
 # işlevleri barındıran sınıfın olduğu yer.
 
+import json
 import logging
+import os
+import tempfile
 
 import numpy as np
 import tensorflow as tf
 
+from data_loader import UNK, _encode, _normalize
+
 logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
 
 
+def _mask_unk(logits, unk_num):
+    """
+    Sets the logit of `data_loader.UNK` to -inf so that it is never sampled;
+    UNK is only there to feed unknown characters *to* the model.
+
+    Parameters
+    ----------
+    logits: tf.Tensor
+        logits of shape (batch, vocab_size)
+
+    unk_num: int
+        the numeric mapping of UNK
+
+    Returns
+    -------
+    the masked logits
+    """
+    return logits + tf.one_hot(unk_num, tf.shape(logits)[-1],
+                               on_value=-np.inf, off_value=0.)
+
+
 class TextGenerator(tf.keras.Model):
     """
     Eğitilmiş YazbelNet örneği üzerinden tekst üretimi yapmaya olanak sağlar.
     """
-    def __init__(self, model, char2num, num2char, temperature=0.5):
+    def __init__(self, model, char2num, num2char, temperature=0.5,
+                 normalization=None):
         """
         Parameters
         -----------
@@ -35,11 +62,17 @@ class TextGenerator(tf.keras.Model):
             daha doğru cümleler ortaya çıkıyor. Arttığında ise karakter seçimi
             içerisine rastgelelik girmeye başlıyor ve modelin değişik anlam
             yollarına sapması gözlenebiliyor.
+
+        normalization: str, optional, default=None
+            Modelin eğitildiği metne uygulanan Unicode normalizasyonu; seed'e
+            de uygulanır.
         """
         super().__init__(self)
         self.char2num = char2num
         self.num2char = num2char
         self.temperature = temperature
+        self.normalization = normalization
+        self.unk_num = char2num[UNK]
         self.model = model
 
     @tf.function
@@ -72,6 +105,9 @@ class TextGenerator(tf.keras.Model):
         logits = logits[:, -1, :]
         logits /= self.temperature
 
+        # never generate UNK
+        logits = _mask_unk(logits, self.unk_num)
+
         # randomly sample the next character (its numeric mapping, actually)
         # from logits, but not uniform, weighted!
         predicted_num = tf.random.categorical(logits, num_samples=1)
@@ -98,24 +134,17 @@ class TextGenerator(tf.keras.Model):
 
         Notes
         -----
-        If any character of the given seed is not in the user's vocabulary,
-        then we set the seed to a random letter from the vocabulary.
+        Characters of the seed that are not in the user's vocabulary are fed
+        to the model as `data_loader.UNK`.
         """
-        if any(char not in self.char2num for char in seed):
-            logging.warn(f"The seed {seed} contains non-vocab characters,"
-                         " defaulting to a random character..")
-            seed = np.random.choice(np.array(list(self.char2num.keys())))
-
         # start with the seed
-        next_seq = seed
-        result = [next_seq]
+        next_seq = _normalize(seed, self.normalization)
+        result = [seed]
 
         states = None
         for _ in range(length):
             # convert the character(s) to numerics
-            next_seq = np.array(
-                            [self.char2num[char] for char in next_seq]
-                        ).reshape(1, -1)
+            next_seq = _encode(next_seq, self.char2num).reshape(1, -1)
             # Get the next character prediction in numeric and convert to char
             # note that this will be the input to the model in next turn!
             next_num, states = self.generate_one_step(next_seq, states=states)
@@ -124,3 +153,149 @@ class TextGenerator(tf.keras.Model):
             result.append(next_seq)
 
         return "".join(result)
+
+
+class GenerationModule(tf.Module):
+    """
+    Tekst üretimi için gereken iki fonksiyonu sabit imzalarla (fixed input
+    signatures) taşıyan ve SavedModel olarak dışa aktarılan modül. İmzalar
+    sabit olduğundan yüklendikten sonra hiçbir çağrıda yeniden izleme
+    (retracing) olmaz; sözlük de SavedModel'in "asset"i olarak yanında durur.
+    """
+    def __init__(self, model, vocab_path, unk_num):
+        """
+        Parameters
+        -----------
+        model: network.YazbelNet
+            Halihazırda eğitilmiş olduğu varsayılan YazbelNet örneği
+
+        vocab_path: str
+            Sözlüğün (id sırasıyla karakterler ve Unicode normalizasyonu)
+            JSON olarak yazıldığı dosya
+
+        unk_num: int
+            `data_loader.UNK`in sayısal karşılığı; üretimde hiç seçilmez
+        """
+        super().__init__()
+        # the variables of a model fresh from `load_weights` are only created
+        # (and restored) on its first call; make sure they exist
+        model(tf.zeros((1, 1), dtype=tf.int64))
+        # only the weights are tracked (and so saved); tracking the Keras
+        # model itself would save all of its traced Keras call functions
+        # too, and loading those back is slower than building the model
+        self.model_variables = list(model.variables)
+        # a bound method is not tracked, the functions below just use it
+        self._call_model = model.__call__
+        self.unk_num = unk_num
+        self.vocab_file = tf.saved_model.Asset(vocab_path)
+
+    def _sample(self, logits, temperature):
+        # take the last timestep's values as logits and apply temperature;
+        # never generate UNK
+        logits = _mask_unk(logits[:, -1, :] / temperature, self.unk_num)
+        return tf.random.categorical(logits, num_samples=1)
+
+    @tf.function(input_signature=[tf.TensorSpec([1, None], tf.int64),
+                                  tf.TensorSpec([], tf.float32)])
+    def encode_prefix(self, inputs, temperature):
+        """
+        Runs the seed through the model from the initial state; returns the
+        first predicted character (in numeric form) and the rnn state.
+        """
+        logits, states = self._call_model(inputs=inputs, return_state=True)
+        return self._sample(logits, temperature), states
+
+    @tf.function(input_signature=[tf.TensorSpec([1, 1], tf.int64),
+                                  tf.TensorSpec([1, None], tf.float32),
+                                  tf.TensorSpec([], tf.float32)])
+    def step(self, inputs, states, temperature):
+        """
+        One step of generation: the previous character and the rnn state in,
+        the next character (in numeric form) and the new state out.
+        """
+        logits, states = self._call_model(inputs=inputs, states=states,
+                                          return_state=True)
+        return self._sample(logits, temperature), states
+
+
+def export_generator(model, char2num, export_path, normalization=None):
+    """
+    Exports the trained model as a SavedModel with pre-traced generation
+    functions (see `GenerationModule`) and the vocabulary as an asset, so
+    that `SavedModelGenerator` can start generating without building the
+    model or tracing anything.
+
+    Parameters
+    ----------
+    model: network.YazbelNet
+        The trained model
+
+    char2num: dict
+        The mapping from characters to numbers the model is trained with
+
+    export_path: str
+        The directory to export to
+
+    normalization: str, optional, default=None
+        The Unicode normalization of the training text, stored with the
+        vocabulary so that the seed is normalized the same way
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vocab_path = os.path.join(tmp_dir, "vocab.json")
+        with open(vocab_path, "w", encoding="utf-8") as fh:
+            json.dump({"chars": sorted(char2num, key=char2num.get),
+                       "normalization": normalization}, fh)
+
+        # the asset is copied into the SavedModel while saving
+        tf.saved_model.save(GenerationModule(model, vocab_path,
+                                             char2num[UNK]),
+                            export_path)
+
+
+class SavedModelGenerator:
+    """
+    `TextGenerator`ın `export_generator` ile dışa aktarılmış SavedModel
+    üzerinden çalışanı. Model inşa edilmediği ve fonksiyonlar önceden
+    izlendiği için ilk karakter daha çabuk gelir.
+    """
+    def __init__(self, export_path, temperature=0.5):
+        """
+        Parameters
+        -----------
+        export_path: str
+            `export_generator` ile dışa aktarılmış SavedModel'in dizini
+
+        temperature: float, optional, default=0.5
+            Tekst üreticinin "harareti", `TextGenerator`daki gibi.
+        """
+        self.module = tf.saved_model.load(export_path)
+        vocab_path = self.module.vocab_file.asset_path.numpy().decode("utf-8")
+        with open(vocab_path, "r", encoding="utf-8") as fh:
+            vocab = json.load(fh)
+        self.char2num = {char: num for num, char in enumerate(vocab["chars"])}
+        self.num2char = dict(enumerate(vocab["chars"]))
+        self.normalization = vocab["normalization"]
+        self.temperature = tf.constant(temperature, dtype=tf.float32)
+
+    def sample_text(self, length=200, seed="Merhaba"):
+        """
+        Samples a `length` length text starting with `seed`; see
+        `TextGenerator.sample_text`.
+        """
+        result = [seed]
+
+        states = None
+        for _ in range(length):
+            if states is None:
+                # the whole seed at once, from the initial state
+                inputs = _encode(_normalize(seed, self.normalization),
+                                 self.char2num).reshape(1, -1).astype(np.int64)
+                next_num, states = self.module.encode_prefix(
+                                                inputs, self.temperature)
+            else:
+                # the previous prediction is the next input
+                next_num, states = self.module.step(next_num, states,
+                                                    self.temperature)
+            result.append(self.num2char[next_num.numpy().item()])
+
+        return "".join(result)
@@ -4,13 +4,27 @@ import argparse
 import json
 import logging
 import os
+import shutil
+import sys
+import tempfile
 
-from data_loader import make_dataset
-from network import YazbelNet
+from autotune import autotune
+from data_loader import _vocab_kwargs, make_dataset
+from dedup import dedup_replies, remove_deduped
+from network import (YazbelNet, _EpochTimer, _check_model, _get_strategy,
+                     _make_manifest_entry, _update_manifest)
+from text_generator import export_generator
 from yazbel_parser import save_user_replies
 
 logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
 
+# `python train.py distill username [--options]` distills the trained model of
+# the user into a smaller one, see distiller.py
+if sys.argv[1:2] == ["distill"]:
+    from distiller import main
+    main(sys.argv[2:])
+    sys.exit()
+
 # Command line parser
 parser = argparse.ArgumentParser(
                 # let's show the defaults in --help too
@@ -66,15 +80,79 @@ parser.add_argument("--es-patience",
                     type=int,
                     default=5)
 
+parser.add_argument("--vocab-min-count",
+                    help="bir karakterin sözlüğe girmesi için en az kaç kere"
+                         " geçmesi gereksin? girmeyenler UNK olur",
+                    type=int,
+                    default=1)
+
+parser.add_argument("--vocab-max-size",
+                    help="sözlükte (UNK dahil) en fazla kaç karakter olsun?"
+                         " en sık geçenler kalır",
+                    type=int,
+                    default=None)
+
+parser.add_argument("--unicode-normalization",
+                    help="metin hangi Unicode normal formuna getirilsin?",
+                    choices=["NFC", "NFKC", "NFD", "NFKD"],
+                    default=None)
+
+parser.add_argument("--dedup-threshold",
+                    help="forumdan çekilen yanıtlarda birbirine bu oranda"
+                         " (Jaccard) benzeyen bloklardan sadece ilki kalsın",
+                    type=float,
+                    default=0.8)
+
+parser.add_argument("--no-dedup",
+                    help="tekrar eden yanıtlar ayıklanmasın",
+                    action="store_true")
+
+parser.add_argument("--distribute",
+                    help="eğitim nasıl dağıtılsın? multi_worker için küme"
+                         " TF_CONFIG'ten okunur ve --batch-size worker başına"
+                         " olur",
+                    choices=["none", "mirrored", "multi_worker"],
+                    default="none")
+
+parser.add_argument("--autotune",
+                    help="eğitimden önce en hızlı --batch-size ve --seq-length"
+                         " ölçülerek seçilsin",
+                    action="store_true")
+
+parser.add_argument("--autotune-batch-sizes",
+                    help="--autotune'da denenecek batch size'lar",
+                    default="4,16,64,256")
+
+parser.add_argument("--autotune-seq-lengths",
+                    help="--autotune'da denenecek sequence length'ler",
+                    default="50,100,200")
+
+parser.add_argument("--memory-budget",
+                    help="--autotune'un seçeceği ayarın bellek sınırı (MB)",
+                    type=float,
+                    default=1024)
+
 args = parser.parse_args()
+if args.autotune and args.distribute == "multi_worker":
+    # each worker would pick on its own, possibly differently
+    parser.error("--autotune can't be used with --distribute multi_worker")
+if args.vocab_max_size is not None and args.vocab_max_size < 2:
+    # UNK and at least one real character
+    parser.error("--vocab-max-size must be at least 2")
+
+# multi worker strategy has to be created before any other TF op
+strategy, num_workers, worker_index, is_chief = _get_strategy(args.distribute)
 
 # used many times, so assign it to a variable :)
 username = args.username
 
 # if found that already parsed replies exist for a username, ask if still want
-# to parse again
+# to parse again. Workers of a cluster are not interactive: they expect the
+# replies to be there already and they always train.
 to_parse = True
-if os.path.exists(f"replies/{username}.txt"):
+if args.distribute == "multi_worker":
+    to_parse = False
+elif os.path.exists(f"replies/{username}.txt"):
     ans = input(f"Saved replies found for `{username}` - do you still want"
                 " to get replies from forum.yazbel.com? (y / [n]): ")
     to_parse = ans.lower().startswith("y")
@@ -85,60 +163,123 @@ os.makedirs("saved_models", exist_ok=True)
 # path to save / load model
 model_path = os.path.join("saved_models", f"{username}_model")
 
-# If it's going to parse, it also means training will take place too; but
-# reverse may not necessarily hold
-to_train = to_parse
-
 if to_parse:
     save_user_replies(username, args.driver_path)
     logging.info("Kullanıcının forumdaki yanıtları elde edildi ve kaydedildi")
-elif os.path.exists(model_path + ".index"):
-    # already found a trained model for this user
-    from network import _check_model, _load_model
-    model = _load_model(username, args, model_path)
-
-    # check if configs are the same
-    model_ok = _check_model(username, args)
-    if model_ok:
-        # ok, same configs; ask
-        ans = input(f"Trained model found for `{username}` - do you still want"
-                    " to train? (y / [n]): ")
-        to_train = ans.lower().startswith("y")
+
+# quotes, signatures, copy-pasted code etc. repeat a lot; drop them before the
+# dataset is made so that the model doesn't loop over them. The raw replies
+# are kept, so this is redone on every run (a changed threshold or
+# --no-dedup takes effect without scraping again). Workers of a cluster use
+# whatever is there, not to write the same file all at once.
+if args.distribute != "multi_worker":
+    if args.no_dedup:
+        remove_deduped(username)
     else:
-        # configs are not the same!
-        to_train = True
+        dedup_replies(username, threshold=args.dedup_threshold)
+
+# Retrain only if the data or the architecture has changed; this is a cheap
+# check on the manifest, the model itself is not loaded
+if args.distribute == "multi_worker":
+    to_train = True
+elif os.path.exists(model_path + ".index") and _check_model(username, args):
+    # ok, same data and architecture; ask
+    ans = input(f"Trained model found for `{username}` - do you still want"
+                " to train? (y / [n]): ")
+    to_train = ans.lower().startswith("y")
 else:
-    # rare case: it's not going to parse but no saved model found either
+    # either no saved model or data / architecture is not the same!
     to_train = True
 
 if to_train:
+    # pick the fastest batch size & sequence length within the memory budget
+    if args.autotune:
+        logging.info("En hızlı batch size ve sequence length aranıyor..")
+        best, results = autotune(
+                username, args,
+                batch_sizes=[int(n) for n in
+                             args.autotune_batch_sizes.split(",")],
+                seq_lengths=[int(n) for n in
+                             args.autotune_seq_lengths.split(",")],
+                memory_budget_mb=args.memory_budget)
+        if best is None:
+            logging.warning("No configuration fits in the memory budget,"
+                            " keeping --batch-size and --seq-length")
+        else:
+            args.batch_size, args.seq_length = best
+            logging.info(f"Seçilen: --batch-size {args.batch_size}"
+                         f" --seq-length {args.seq_length}")
+        # goes into the saved config along with the other arguments
+        args.autotune_results = results
+
     # prepare the dataset
     train_ds, val_ds, (char2num, num2char) = make_dataset(
                                                     username,
                                                     val_frac=args.val_frac,
                                                     seq_length=args.seq_length,
-                                                    batch_size=args.batch_size
+                                                    batch_size=args.batch_size,
+                                                    num_shards=num_workers,
+                                                    shard_index=worker_index,
+                                                    **_vocab_kwargs(args)
                                                 )
     logging.info("Kullanıcının yanıtlarından veri seti oluşturuldu")
 
     # make the model
     logging.info("Model oluşturuluyor ve eğitim (training) başlıyor..")
 
-    model = YazbelNet(vocab_size=len(char2num),
-                      embedding_dim=args.embedding_dim,
-                      rnn_hidden_units=args.rnn_hidden_units)
-    # train the model (may take time! e.g. hours)
-    model = model.train(train_ds, val_ds=val_ds, loss=args.loss,
-                        optimizer=args.optimizer, epochs=args.epochs,
-                        es_patience=args.es_patience)
+    # times the training part of each epoch; the first one (building,
+    # tracing, connecting the workers) is left out of the reported speed
+    epoch_timer = _EpochTimer()
+
+    # variables are to be created (and the model compiled) in the scope
+    # of the strategy so that they are mirrored across replicas
+    with strategy.scope():
+        model = YazbelNet(vocab_size=len(char2num),
+                          embedding_dim=args.embedding_dim,
+                          rnn_hidden_units=args.rnn_hidden_units)
+        # train the model (may take time! e.g. hours)
+        model = model.train(train_ds, val_ds=val_ds, loss=args.loss,
+                            optimizer=args.optimizer, epochs=args.epochs,
+                            es_patience=args.es_patience,
+                            callbacks=[epoch_timer])
+    train_seconds, timed_epochs = epoch_timer.steady_seconds()
 
     logging.info("Modelin eğitimi tamamlandı")
 
-    # save the weights and configs
-    model.save_weights(model_path)
+    # every worker has to take part in saving, but only the chief's copy is
+    # kept (along with the configs)
+    if not is_chief:
+        worker_dir = tempfile.mkdtemp()
+        model.save_weights(os.path.join(worker_dir, f"{username}_model"))
+        export_generator(model, char2num,
+                         os.path.join(worker_dir, f"{username}_savedmodel"),
+                         normalization=args.unicode_normalization)
+        shutil.rmtree(worker_dir)
+    else:
+        # save the weights and configs
+        model.save_weights(model_path)
+
+        # and a SavedModel to sample from without building the model and
+        # tracing the generation functions (see sample.py --savedmodel)
+        export_generator(model, char2num,
+                         os.path.join("saved_models",
+                                      f"{username}_savedmodel"),
+                         normalization=args.unicode_normalization)
+
+        config_save_path = os.path.join("saved_models",
+                                        f"{username}_config.txt")
+        with open(config_save_path, "w") as fh:
+            json.dump(vars(args), fh)
 
-    config_save_path = os.path.join("saved_models", f"{username}_config.txt")
-    with open(config_save_path, "w") as fh:
-        json.dump(vars(args), fh)
+        # manifest: architecture, data & vocab hashes and training metrics
+        history = model.history.history
+        metrics = {"epochs": len(history["loss"]),
+                   "train_seconds": train_seconds,
+                   "timed_epochs": timed_epochs,
+                   "num_workers": num_workers}
+        metrics.update({name: float(values[-1])
+                        for name, values in history.items()})
+        _update_manifest(f"{username}_model",
+                         _make_manifest_entry(username, args, metrics=metrics))
 
-    logging.info("Model kaydedildi")
+        logging.info("Model kaydedildi")